@@ -2,9 +2,9 @@
 Base classes for abstracting access to objects on a file system.
 """
 
-import datetime
 import functools
 import os
+import time
 
 
 try:
@@ -53,6 +53,8 @@ class FSBase(object):
     supports_mkdir = False
     supports_delete = False
     supports_rename = False
+    # Whether the filesystem (and its directory cache) may be used from several threads at once
+    supports_threads = False
 
     def __init__(self):
         self.cached_dirs = {}
@@ -76,26 +78,54 @@ class FSBase(object):
         """
         Return a given directory for a given filesystem (through the cache).
         """
-        cache_key = None
-        if self.do_caching:
-            cache_key = self.normalise_name(dirname)
-            fsdir = self.cached_dirs.get(cache_key, None)
-            if fsdir is not None:
-                return fsdir
-
-        # We recurse upwards, trying to get earlier dirs so that we have all the
-        # directories cached, if we need to. Or we'll report errors if the directory
-        # did not exist.
-        parent = self.dirname(dirname)
-        parent_fsdir = None
-        if dirname != parent and dirname != '':
-            parent_fsdir = self.dir(parent)
+        # We create the earlier dirs first, so that we have all the directories
+        # cached, if we need to. Or we'll report errors if the directory did not exist.
+        dirnames = self.dir_chain(dirname)
 
-        fsdir = self.get_dir(dirname, parent_fsdir)
+        # Find the deepest directory that we already know about
+        parent_fsdir = None
+        start = 0
         if self.do_caching:
-            self.cached_dirs[cache_key] = fsdir
+            for index in range(len(dirnames) - 1, -1, -1):
+                fsdir = self.cached_dirs.get(self.normalise_name(dirnames[index]), None)
+                if fsdir is not None:
+                    if index == len(dirnames) - 1:
+                        return fsdir
+                    parent_fsdir = fsdir
+                    start = index + 1
+                    break
+
+        for name in dirnames[start:]:
+            fsdir = self.get_dir(name, parent_fsdir)
+            if self.do_caching:
+                self.cached_dirs[self.normalise_name(name)] = fsdir
+            parent_fsdir = fsdir
         return fsdir
 
+    def dir_chain(self, dirname):
+        """
+        Return the names of the directories leading to a directory.
+
+        @param dirname: The directory name to find the parents of
+        @return: List of the directory names, outermost first and ending with dirname
+        """
+        parts = self.split(dirname)
+        if not parts:
+            rootname = self.rootname()
+            if dirname == rootname or dirname == '':
+                return [dirname]
+            return self.dir_chain(rootname) + [dirname]
+
+        # Build up the names of the parents as we go, rather than joining each from scratch
+        rootname = self.rootname()
+        dirnames = ['']
+        name = None
+        for part in parts[:-1]:
+            name = part if name is None else name + self.dirsep + part
+            dirnames.append(name if name.startswith(rootname) else rootname + name)
+        dirnames.append(dirname)
+        return dirnames
+
     def get_dir(self, dirname, parent_fsdir=None):
         """
         Overloadable: Return a given directory for a given filesystem.
@@ -263,6 +293,17 @@ class FSFileBase(object):
     TYPE_IMAGE = 0x3000
     TYPE_LOADEXEC = -1
 
+    # The text for each filetype number that has been formatted
+    _filetype_text = {}
+    # Bound formatters for the text we produce
+    _format_image_filetype = "Image file (&{:03X})".format
+    _format_filetype = "&{:03X}".format
+    _format_size = "{} bytes".format
+
+    # There may be a great many files, so we don't give each one a dictionary.
+    # Subclasses which do not declare their own slots will still get one.
+    __slots__ = ('fs', 'filename', 'dirname', 'leafname', '_size', '_epochtime', '_parent')
+
     def __init__(self, fs, filename, size=None, epochtime=None, parent=None):
         self.fs = fs
         self.filename = filename
@@ -373,38 +414,52 @@ class FSFileBase(object):
         filetype = self.filetype()
         if filetype == self.TYPE_DIRECTORY or self.isdir():
             return "Directory"
-        if filetype == self.TYPE_LOADEXEC:
-            return "Untyped"
-
-        if filetype >= self.TYPE_IMAGE:
-            return "Image file (&{:03X})".format(filetype)
 
-        return "&{:03X}".format(filetype)
+        text = self._filetype_text.get(filetype)
+        if text is None:
+            if filetype == self.TYPE_LOADEXEC:
+                text = "Untyped"
+            elif filetype >= self.TYPE_IMAGE:
+                text = self._format_image_filetype(filetype)
+            else:
+                text = self._format_filetype(filetype)
+            self._filetype_text[filetype] = text
+        return text
 
     def format_size(self):
         size = self.size()
         if size == -1 or size is None:
             return "Unknown"
-        return "{} bytes".format(size)
+        return self._format_size(size)
 
     def format_timestamp(self):
         epochtime = self.epochtime()
         if epochtime is None:
             return "Unknown"
-        dt = datetime.datetime.utcfromtimestamp(epochtime)
-        return dt.strftime('%H:%M:%S.X %d %b %Y').replace('X', '{:02}'.format(dt.microsecond / 10000))
+        # Round to microseconds first, as datetime would, so the centiseconds are stable
+        seconds = int(epochtime // 1)
+        microseconds = int(round((epochtime - seconds) * 1000000))
+        if microseconds >= 1000000:
+            seconds += 1
+            microseconds -= 1000000
+        return time.strftime('%H:%M:%S.{:02} %d %b %Y'.format(microseconds // 10000),
+                             time.gmtime(seconds))
 
 
 class FSDirectoryBase(object):
     """
     Object for retrieving information about files within a filesystem.
     """
+    __slots__ = ('fs', 'parent', 'dirname', '_files', '_files_sorted', 'generation')
 
     def __init__(self, fs, parent, dirname):
         self.fs = fs
         self.parent = parent or self
         self.dirname = dirname
         self._files = None
+        self._files_sorted = None
+        # Incremented each time the files are read, so that users can tell when they change
+        self.generation = 0
 
     def __repr__(self):
         return "<{}(fs={}, dirname={!r})>".format(self.__class__.__name__, self.fs, self.dirname)
@@ -419,9 +474,9 @@ class FSDirectoryBase(object):
         """
         Overridden: Return a list of the files in this directory.
 
-        @return: A list of objects which describe the files in the directory; can be
-                 leafnames as strings or structures. The values will be passed to
-                 get_file() to convert to a FSFile object.
+        @return: A list (or other iterable) of objects which describe the files in the
+                 directory; can be leafnames as strings or structures. The values will
+                 be passed to get_file() to convert to a FSFile object.
         """
         return []
 
@@ -459,16 +514,21 @@ class FSDirectoryBase(object):
 
     def invalidate(self):
         self._files = None
+        self._files_sorted = None
 
     def populate_files(self):
         if self._files is None:
             filelist = self.get_filelist()
 
-            self._files = {}
+            # The list may be read as we go, so only keep the files once we have them all
+            files = {}
             for f in filelist:
                 fsfile = self.get_file(f)
                 namekey = self.fs.normalise_name(fsfile.leafname)
-                self._files[namekey] = fsfile
+                files[namekey] = fsfile
+            self._files = files
+            self._files_sorted = None
+            self.generation += 1
 
     @property
     def files(self):
@@ -476,8 +536,10 @@ class FSDirectoryBase(object):
         Return a list of objects for files within this directory
         """
         self.populate_files()
+        if self._files_sorted is None:
+            self._files_sorted = sorted(self._files.values(), key=lambda fsfile: fsfile.leafname)
 
-        return sorted(self._files.values())
+        return list(self._files_sorted)
 
     def is_writeable(self):
         """
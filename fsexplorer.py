@@ -2,61 +2,242 @@
 FSExplorer views, using the fs interfaces.
 """
 
+import collections
+import itertools
+import operator
 import os.path
+import time
+import warnings
+import weakref
 
 import wx
-from wx.svg import SVGimage
 import wx.lib.scrolledpanel as scrolled
 
-from fsinfo import FSFileInfoFrame
+from fsinfo import FSFileInfoFrame, measure_text
+
+
+try:
+    import concurrent.futures
+except ImportError:
+    # Python 2, without the futures backport
+    concurrent = None
+
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # Python 2
+    monotonic = time.time
 
 
 class SVGForFiletype(object):
     """
     Singleton class which caches the icons for the files.
+
+    Both the parsed SVGs and the bitmaps rendered from them are cached. The caches
+    are bounded, discarding the least recently used icons.
     """
     FILETYPE_DIRECTORY = 0x1000
     FILETYPE_APPLICATION = 0x2000
     FILETYPE_LOADEXEC = -1
     resource_dir = os.path.dirname(__file__)
+    max_cached_svgs = 256
+    max_cached_bitmaps = 256
+    # Height that the SVGs are rendered at, from which smaller bitmaps are scaled
+    max_icon_size = 128
+    fallback_leafname = 'file_xxx.svg'
+    # The icons for the types which aren't numbered filetypes
+    special_leafnames = {
+            FILETYPE_DIRECTORY: 'directory.svg',
+            # We could use the leafname here.
+            FILETYPE_APPLICATION: 'application.svg',
+            FILETYPE_LOADEXEC: 'file_lxa.svg',
+        }
 
     def __init__(self):
-        self.filetype_svg = {}
+        self.filetype_svg = collections.OrderedDict()
+        self.filetype_bitmap = collections.OrderedDict()
+        self.filetype_image = collections.OrderedDict()
+        # The aspect ratio of the SVG for each filetype, which outlives the SVG itself
+        self.filetype_aspect = {}
+        # The content of the icon files, so that we need not go to the disk for each filetype
+        self.icon_data = self.read_icons()
+        # The resolved SVG leafname for each filetype, including the fallbacks
+        self.filetype_leafname = self.find_filetype_leafnames()
+
+    def find_filetype_leafnames(self):
+        """
+        Find the filetypes which have their own icons.
+
+        @return: dictionary of icon leafnames, keyed by filetype number
+        """
+        filetype_leafname = {}
+        for leafname in self.icon_data:
+            if leafname.startswith('file_') and len(leafname) == 12:
+                try:
+                    filetype_leafname[int(leafname[5:8], 16)] = leafname
+                except ValueError:
+                    # Not a numbered filetype, like file_xxx.svg
+                    pass
+        return filetype_leafname
+
+    def read_icons(self):
+        """
+        Read the SVG files that are present in the icons directory.
+
+        @return: dictionary of the file contents, keyed by leafname
+        """
+        icons_dir = os.path.join(self.resource_dir, 'icons')
+        try:
+            leafnames = os.listdir(icons_dir)
+        except OSError:
+            leafnames = []
+
+        icon_data = {}
+        for leafname in leafnames:
+            if leafname.endswith('.svg'):
+                with open(os.path.join(icons_dir, leafname), 'rb') as fh:
+                    icon_data[leafname] = fh.read()
+        return icon_data
+
+    def _cache_lookup(self, cache, key, limit, create):
+        """
+        Look up a key in a least-recently-used cache, creating the value if needed.
+        """
+        value = cache.pop(key, None)
+        if not value:
+            value = create()
+            if len(cache) >= limit:
+                cache.popitem(last=False)
+
+        # Most recently used entries live at the end
+        cache[key] = value
+        return value
 
     def get_svg(self, filetype, leafname):
-        svg = self.filetype_svg.get(filetype)
-        if not svg:
-            if filetype == self.FILETYPE_DIRECTORY:
-                filename = 'icons/directory.svg'
-            elif filetype == self.FILETYPE_APPLICATION:
-                # We could use the leafname here.
-                filename = 'icons/application.svg'
-            elif filetype == self.FILETYPE_LOADEXEC:
-                filename = 'icons/file_lxa.svg'
+        return self._cache_lookup(self.filetype_svg, filetype, self.max_cached_svgs,
+                                  lambda: self.load_svg(filetype))
+
+    def get_aspect(self, filetype):
+        """
+        Return the aspect ratio (width / height) of the icon for a filetype.
+        """
+        aspect = self.filetype_aspect.get(filetype)
+        if aspect is None:
+            svg = self.get_svg(filetype, None)
+            aspect = float(svg.width) / svg.height
+            self.filetype_aspect[filetype] = aspect
+        return aspect
+
+    def get_image(self, filetype):
+        """
+        Return an image of the icon for a filetype, rendered at the maximum size.
+        """
+        def render():
+            height = self.max_icon_size
+            width = int(height * self.get_aspect(filetype))
+            bitmap = self.get_svg(filetype, None).ConvertToScaledBitmap(wx.Size(width, height))
+            return bitmap.ConvertToImage()
+
+        return self._cache_lookup(self.filetype_image, filetype, self.max_cached_svgs, render)
+
+    def get_bitmap(self, filetype, size):
+        """
+        Return a bitmap of the icon for a filetype, rendered at a given size.
+        """
+        (width, height) = (int(size[0]), int(size[1]))
+
+        def render():
+            if height > self.max_icon_size:
+                # Larger than we render, so scaling would lose detail.
+                return self.get_svg(filetype, None).ConvertToScaledBitmap(wx.Size(width, height))
+            image = self.get_image(filetype)
+            return image.Scale(width, height, wx.IMAGE_QUALITY_HIGH).ConvertToBitmap()
+
+        return self._cache_lookup(self.filetype_bitmap, (filetype, width, height), self.max_cached_bitmaps,
+                                  render)
+
+    def get_leafname(self, filetype):
+        """
+        Return the leafname of the SVG to use for a given filetype.
+        """
+        leafname = self.filetype_leafname.get(filetype)
+        if not leafname:
+            # Numbered filetypes with icons are already known, so this is a special
+            # type or one for which we must use the fallback.
+            leafname = self.special_leafnames.get(filetype)
+            if leafname not in self.icon_data:
+                leafname = self.fallback_leafname
+            self.filetype_leafname[filetype] = leafname
+        return leafname
+
+    def get_bitmap_for_height(self, filetype, height):
+        """
+        Return a bitmap of the icon for a filetype, at a given height and its natural aspect ratio.
+        """
+        height = int(height)
+        width = int(height * self.get_aspect(filetype))
+        return self.get_bitmap(filetype, (width, height))
+
+    def get_filename(self, filetype):
+        """
+        Return the SVG filename to use for a given filetype.
+        """
+        return os.path.join(self.resource_dir, 'icons', self.get_leafname(filetype))
+
+    def parse_svg(self, leafname):
+        """
+        Parse an icon SVG.
+
+        @return: SVGimage, or None if the icon could not be used
+        """
+        # The SVG support is only loaded once we need to draw an icon.
+        from wx.svg import SVGimage
+
+        try:
+            data = self.icon_data.get(leafname)
+            if data is None:
+                svg = SVGimage.CreateFromFile(os.path.join(self.resource_dir, 'icons', leafname))
             else:
-                filename = 'icons/file_{:03x}.svg'.format(filetype)
-            svg_filename = os.path.join(self.resource_dir, filename)
-            if not os.path.exists(svg_filename):
-                filename = 'icons/file_xxx.svg'
-                svg_filename = os.path.join(self.resource_dir, filename)
-            svg = SVGimage.CreateFromFile(svg_filename)
-
-            self.filetype_svg[filetype] = svg
+                svg = SVGimage.CreateFromBytes(data)
+        except Exception:
+            return None
+        if svg.width <= 0 or svg.height <= 0:
+            return None
+        return svg
+
+    def load_svg(self, filetype):
+        """
+        Load the SVG for a given filetype, without caching.
+        """
+        leafname = self.get_leafname(filetype)
+        svg = self.parse_svg(leafname)
+        if svg is None and leafname != self.fallback_leafname:
+            # Remember that this filetype must use the fallback, so we don't try again.
+            self.filetype_leafname[filetype] = self.fallback_leafname
+            svg = self.parse_svg(self.fallback_leafname)
         return svg
 
 
 svg_for_filetype = SVGForFiletype()
 
 
-class FSFileIcon(wx.Panel):
+class FSFileIcon(wx.Control):
+    """
+    A single file in the explorer, drawn directly rather than built from child widgets.
+
+    The layout of the sprite and the text is calculated once on creation, and the
+    paint handler just draws the cached bitmap and strings at those positions.
+    """
 
     min_icon_width = 64
     icon_padding = 4
     default_icon_height = 56
     inner_spacing = 4
+    text_colour = wx.Colour(0, 0, 0)
 
     def __init__(self, frame, parent, text_width, text_height, fsfile, *args, **kwargs):
-        kwargs['style'] = wx.DEFAULT_FRAME_STYLE ^ wx.RESIZE_BORDER
+        kwargs['style'] = wx.BORDER_NONE
 
         self.frame = frame
         self.parent = parent
@@ -65,48 +246,38 @@ class FSFileIcon(wx.Panel):
         self.requested_icon_height = kwargs.pop('icon_height', self.default_icon_height)
         self.requested_text_width = max(self.min_icon_width, text_width)
         self.fsfile = fsfile
+        self.index = parent.file_index[fsfile.leafname]
 
         super(FSFileIcon, self).__init__(parent, *args, **kwargs)
-
-        self.selected = False
-        self.sprite_icon = None
+        # We paint every pixel ourselves, so the background need not be erased.
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
 
         self.text_size = self.GetTextSize()
         self.bitmap_size = self.GetSpriteSize()
         self.icon_size = self.GetIconSize()
 
-        self.sprite_icon = self.GetSpriteIcon()
-        self.text_icon = self.GetTextIcon()
+        self.sprite_bitmap = self.GetSpriteBitmap()
+        (self.sprite_pos, self.text_items) = self.GetLayout()
 
         self.SetMaxSize(self.icon_size)
         self.SetMinSize(self.icon_size)
+        self.SetSize(self.icon_size)
 
-        self.sizer = self.SetupSizer()
         self.icons = self.GetButtonIcons()
-        self.icons.append(self)
-
-        for obj in self.icons:
-            obj.Bind(wx.EVT_LEFT_DOWN, self.on_click)
-            obj.Bind(wx.EVT_LEFT_DCLICK, self.on_click)
-            obj.Bind(wx.EVT_RIGHT_DOWN, self.on_click)
-            obj.Bind(wx.EVT_RIGHT_DCLICK, self.on_click)
-            obj.Bind(wx.EVT_MIDDLE_DOWN, self.on_click)
-
-    def SetupSizer(self):
-        vsizer = wx.BoxSizer(wx.VERTICAL)
 
-        vsizer.Add(self.sprite_icon, 0, wx.ALIGN_CENTER_HORIZONTAL, 0)
-        vsizer.AddSpacer(self.inner_spacing)
-        vsizer.Add(self.text_icon, 0, wx.EXPAND | wx.ALL, 0)
-
-        self.SetSizerAndFit(vsizer)
-        if not self.IsDoubleBuffered():
-            self.SetDoubleBuffered(True)  # Reduce flicker on size event.
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_LEFT_DOWN, self.on_click)
+        self.Bind(wx.EVT_LEFT_DCLICK, self.on_click)
+        self.Bind(wx.EVT_RIGHT_DOWN, self.on_click)
+        self.Bind(wx.EVT_RIGHT_DCLICK, self.on_click)
+        self.Bind(wx.EVT_MIDDLE_DOWN, self.on_click)
 
-        return vsizer
+    def AcceptsFocus(self):
+        # Keys are handled by the panel, so we never want to take the focus from it.
+        return False
 
     def GetButtonIcons(self):
-        return [self.sprite_icon, self.text_icon]
+        return [self]
 
     def GetIconSize(self):
         width = max(self.text_size[0], self.bitmap_size[0])
@@ -121,125 +292,125 @@ class FSFileIcon(wx.Panel):
         bitmap_height = self.requested_icon_height - self.inner_spacing - self.text_size[1]
         return wx.Size(int(bitmap_width), int(bitmap_height))
 
-    def GetSpriteIcon(self):
-        sprite_icon = wx.BitmapButton(self, -1, style=wx.BORDER_NONE | wx.BU_EXACTFIT | wx.BU_NOTEXT)
-
+    def GetSpriteBitmap(self):
         filetype = self.fsfile.filetype()
         if self.fsfile.isdir():
             if self.fsfile.leafname.startswith('!'):
                 filetype = svg_for_filetype.FILETYPE_APPLICATION
             else:
                 filetype = svg_for_filetype.FILETYPE_DIRECTORY
-        svg = svg_for_filetype.get_svg(filetype, self.fsfile.leafname)
-        aspect = float(svg.width) / svg.height
-        actual_size = wx.Size(int(self.bitmap_size[1] * aspect), int(self.bitmap_size[1]))
-        bmp = svg.ConvertToScaledBitmap(actual_size)
-
-        sprite_icon.SetBitmap(bmp)
-        sprite_icon.SetMinSize(actual_size)
-        sprite_icon.SetMaxSize(actual_size)
-        return sprite_icon
-
-    def GetTextIcon(self):
-        text_icon = wx.Button(self, -1, label=self.fsfile.leafname,
-                              style=wx.BORDER_NONE | wx.BU_EXACTFIT)
-        text_icon.SetMaxSize(self.text_size)
-        text_icon.SetMinSize(self.text_size)
-        text_icon.SetForegroundColour((0, 0, 0))
-        return text_icon
-
-    def select(self, state=None):
+        return svg_for_filetype.get_bitmap_for_height(filetype, self.bitmap_size[1])
+
+    def GetLayout(self):
+        """
+        Work out where the sprite and the text should be drawn.
+
+        @return: tuple of (sprite position, list of (text, x, y) tuples)
+        """
+        (width, height) = self.icon_size
+        sprite_pos = ((width - self.sprite_bitmap.GetWidth()) // 2, 0)
+
+        leafname = self.fsfile.leafname
+        text_width = self.parent.measure_text(leafname)[0]
+        text_pos = ((width - text_width) // 2, self.bitmap_size[1] + self.inner_spacing)
+        return (sprite_pos, [(leafname, text_pos[0], text_pos[1])])
+
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        if self.selected:
+            background = self.parent.selection_colour
+        else:
+            background = self.parent.GetBackgroundColour()
+        dc.SetBackground(wx.Brush(background))
+        dc.Clear()
+
+        dc.DrawBitmap(self.sprite_bitmap, self.sprite_pos[0], self.sprite_pos[1], True)
+
+        dc.SetFont(self.GetFont())
+        dc.SetTextForeground(self.text_colour)
+        for (text, x, y) in self.text_items:
+            dc.DrawText(text, x, y)
+
+    @property
+    def selected(self):
+        # The panel holds the selection, as the icon may be dematerialized.
+        return bool(self.parent.selected_flags[self.index])
+
+    def select(self, state=None, refresh=True):
+        """
+        Change whether the icon is selected.
+
+        @param state:   True to select, False to deselect, None to toggle
+        @param refresh: False if the caller will redraw the icon itself
+        """
         if state is None:
             state = not self.selected
         else:
             state = bool(state)
-        if self.selected != state:
-            self.selected = state
 
-            if state:
-                self.SetBackgroundColour(self.parent.selection_colour)
-            else:
-                self.SetBackgroundColour(None)
+        if self.selected != state:
+            self.parent._on_icon_select(self, state)
+            if refresh:
+                self.update_background()
 
-            # Ensure that the buttons aren't highlighted too.
-            self.sprite_icon.SetBackgroundColour(None)
-            self.text_icon.SetBackgroundColour(None)
-            self.Refresh()
+    def update_background(self):
+        """
+        Mark the icon as needing to be redrawn to reflect whether we're selected.
+        """
+        self.Refresh(eraseBackground=False)
 
     def on_click(self, event):
         # Ensure that we get focus when we do this (and raise as otherwise we don't get keys)
-        self.frame.Raise()
-        self.frame.SetFocus()
+        self.frame.RequestFocus()
 
         button = self.frame.click_event_to_button(event)
 
         if self.frame.debug:
             print("File Click: Button=%r" % (button,))
 
-        if button == 'D-SELECT':
-            # Run object
-            # (deselect item first)
-            self.select(False)
-            self.frame.OnFileActivate(self.fsfile, close=False)
+        action = self.click_actions.get(button)
+        if action:
+            getattr(self, action)()
 
-        elif button == 'D-ADJUST':
-            # Run object and close window
-            self.frame.OnFileActivate(self.fsfile, close=True)
+    def click_run(self):
+        # Run object
+        # (deselect item first)
+        self.select(False)
+        self.frame.OnFileActivate(self.fsfile, close=False)
 
-        elif button == 'SELECT':
-            self.frame.DeselectAll()
-            self.select()
+    def click_run_close(self):
+        # Run object and close window
+        self.frame.OnFileActivate(self.fsfile, close=True)
 
-        elif button == 'ADJUST':
-            self.select()
-
-        elif button == 'MENU':
-            if not self.selected:
-                self.frame.DeselectAll()
-                self.select()
-            self.frame.on_file_menu(self.fsfile)
-
-
-class LeftAlignedIcons(object):
+    def click_select(self):
+        self.frame.DeselectAll()
+        self.select()
 
-    def __init__(self, parent, text=None, total_width=0, text_icon=None):
-        self.hsizer = wx.BoxSizer(wx.HORIZONTAL)
-        self.parent = parent
-        self.icons = []
-        self.text_width = 0
-        self.text_height = 0
-
-        # The main text icon
-        if text is not None:
-            text_icon = wx.Button(self.parent, -1, label=text.replace('&', '&&'),
-                                  style=wx.BU_LEFT | wx.ALIGN_LEFT | wx.BORDER_NONE)
-
-            dc = wx.ScreenDC()
-            size = dc.GetTextExtent(text)
-            self.text_width = size[0] + 4
-            self.text_height = size[1]
+    def click_adjust(self):
+        self.select()
 
-            size = wx.Size(self.text_width, self.text_height)
-            text_icon.SetMaxSize(size)
-            text_icon.SetMinSize(size)
-
-        else:
-            (self.text_width, self.text_height) = text_icon.GetMaxSize()
+    def click_menu(self):
+        if not self.selected:
+            self.frame.DeselectAll()
+            self.select()
+        self.frame.on_file_menu(self.fsfile)
 
-        text_icon.SetForegroundColour((0, 0, 0))
+    # The method to call for each button name
+    click_actions = {
+            'D-SELECT': 'click_run',
+            'D-ADJUST': 'click_run_close',
+            'SELECT': 'click_select',
+            'ADJUST': 'click_adjust',
+            'MENU': 'click_menu',
+        }
 
-        self.text_icon = text_icon
-        self.icons.append(self.text_icon)
-        self.hsizer.Add(self.text_icon, 0, 0, 0)
 
-        # The padding that sits beside it
-        padding_width = total_width - self.text_width
-        if padding_width > 0:
-            padding = wx.Button(self.parent, -1, label='',
-                                size=wx.Size(int(padding_width), int(self.text_height)),
-                                style=wx.BU_LEFT | wx.ALIGN_LEFT | wx.BORDER_NONE | wx.BU_EXACTFIT)
-            self.hsizer.Add(padding, 0, wx.EXPAND | wx.ALL)
-            self.icons.append(padding)
+def template_size(template):
+    """
+    Return the size of a template string used to size columns, with padding.
+    """
+    extent = measure_text(template)
+    return wx.Size(extent[0] + 4, extent[1])
 
 
 class FSFileLargeIcon(FSFileIcon):
@@ -251,26 +422,26 @@ class FSFileSmallIcon(FSFileIcon):
 
     def __init__(self, frame, parent, text_width, text_height, fsfile, *args, **kwargs):
         kwargs['icon_height'] = self.icon_height
-        self.filename_icons = []
         super(FSFileSmallIcon, self).__init__(frame, parent, text_width, text_height, fsfile, *args, **kwargs)
 
-    def SetupSizer(self):
-        hsizer = wx.BoxSizer(wx.HORIZONTAL)
-
-        hsizer.Add(self.sprite_icon, 0, wx.ALIGN_CENTER_VERTICAL, 0)
-        hsizer.AddSpacer(self.inner_spacing)
+    def GetLayout(self):
+        height = self.icon_size[1]
+        sprite_pos = (0, (height - self.sprite_bitmap.GetHeight()) // 2)
+        text_y = (height - self.text_size[1]) // 2
 
-        self.filename_icons = LeftAlignedIcons(self, text_icon=self.text_icon, total_width=self.requested_text_width)
-        hsizer.Add(self.filename_icons.hsizer, 0, 0, 0)
-        self.AddExtraIcons(hsizer)
+        x = self.bitmap_size[0] + self.inner_spacing
+        text_items = [(self.fsfile.leafname, x, text_y)]
+        self.AddExtraText(text_items, x + self.requested_text_width, text_y)
+        return (sprite_pos, text_items)
 
-        self.SetSizerAndFit(hsizer)
-        if not self.IsDoubleBuffered():
-            self.SetDoubleBuffered(True)  # Reduce flicker on size event?
-
-        return hsizer
+    def AddExtraText(self, text_items, x, y):
+        """
+        Add any further columns of text to the right of the leafname.
 
-    def AddExtraIcons(self, hsizer):
+        @param text_items:  list of (text, x, y) tuples to add to
+        @param x:           position of the end of the leafname column
+        @param y:           vertical position of the text
+        """
         pass
 
     def GetIconSize(self):
@@ -282,63 +453,23 @@ class FSFileSmallIcon(FSFileIcon):
         return wx.Size(int(self.requested_icon_height), int(self.requested_icon_height))
 
     def GetTextSize(self):
-        dc = wx.ScreenDC()
-        size = dc.GetTextExtent(self.fsfile.leafname)
+        size = self.parent.measure_text(self.fsfile.leafname)
         return wx.Size(size[0] + 4, size[1])
 
-    def GetTextIcon(self):
-        text_icon = wx.Button(self, -1, label=self.fsfile.leafname,
-                              style=wx.BU_LEFT | wx.ALIGN_LEFT | wx.BORDER_NONE)
-
-        text_icon.SetMaxSize(self.text_size)
-        text_icon.SetMinSize(self.text_size)
-
-        return text_icon
-
-    def GetButtonIcons(self):
-        icons = [self.sprite_icon]
-        icons.extend(self.filename_icons.icons)
-        return icons
-
 
 class FSFileFullInfoIcon(FSFileSmallIcon):
-    # FIXME: This is not at all efficient - we should really rethink how these rows are drawn
-    # as lots of objects really makes it slow.
     filetype_template_string = "MMMMMMMM"
     timestamp_template_string = "00:00:00.00 00 MMM 0000"
     size_template_string = "XXXXXXXXXX bytes"
 
-    cached_filetype_size = None
-    cached_timestamp_size = None
-    cached_size_size = None
-
-    def __init__(self, frame, parent, text_width, text_height, fsfile, *args, **kwargs):
-        super(FSFileFullInfoIcon, self).__init__(frame, parent, text_width, text_height, fsfile, *args, **kwargs)
-        self.filetype_size = None
-        self.size_icons = None
-        self.timestamp_icons = None
-        self.filetype_icons = None
-
     def GetSizeSize(self):
-        if not self.cached_size_size:
-            dc = wx.ScreenDC()
-            size = dc.GetTextExtent(self.size_template_string)
-            self.__class__.cached_size_size = wx.Size(size[0] + 4, size[1])
-        return self.cached_size_size
+        return template_size(self.size_template_string)
 
     def GetFiletypeSize(self):
-        if not self.cached_filetype_size:
-            dc = wx.ScreenDC()
-            size = dc.GetTextExtent(self.filetype_template_string)
-            self.__class__.cached_filetype_size = wx.Size(size[0] + 4, size[1])
-        return self.cached_filetype_size
+        return template_size(self.filetype_template_string)
 
     def GetTimestampSize(self):
-        if not self.cached_timestamp_size:
-            dc = wx.ScreenDC()
-            size = dc.GetTextExtent(self.timestamp_template_string)
-            self.__class__.cached_timestamp_size = wx.Size(size[0] + 4, size[1])
-        return self.cached_timestamp_size
+        return template_size(self.timestamp_template_string)
 
     def GetIconSize(self):
         width = self.requested_text_width + self.inner_spacing + self.bitmap_size[0]
@@ -348,26 +479,13 @@ class FSFileFullInfoIcon(FSFileSmallIcon):
         height = max(self.text_size[1], self.bitmap_size[1])
         return wx.Size(int(width), int(height))
 
-    def GetButtonIcons(self):
-        icons = [self.sprite_icon]
-        icons.extend(self.filename_icons.icons)
-        icons.extend(self.size_icons.icons)
-        icons.extend(self.filetype_icons.icons)
-        icons.extend(self.timestamp_icons.icons)
-        return icons
-
-    def AddExtraIcons(self, hsizer):
-        self.size_icons = LeftAlignedIcons(self, text=self.fsfile.format_size(), total_width=self.GetSizeSize()[0])
-        hsizer.Add(self.size_icons.hsizer, 0, 0, 0)
-        hsizer.AddSpacer(self.inner_spacing)
-
-        self.filetype_icons = LeftAlignedIcons(self, text=self.fsfile.format_filetype(), total_width=self.GetFiletypeSize()[0])
-        hsizer.Add(self.filetype_icons.hsizer, 0, 0, 0)
-        hsizer.AddSpacer(self.inner_spacing)
-
-        self.timestamp_icons = LeftAlignedIcons(self, text=self.fsfile.format_timestamp(), total_width=self.GetTimestampSize()[0])
-        hsizer.Add(self.timestamp_icons.hsizer, 0, 0, 0)
-        hsizer.AddSpacer(self.inner_spacing)
+    def AddExtraText(self, text_items, x, y):
+        details = self.parent.get_file_details(self.fsfile)
+        sizes = (self.GetSizeSize(), self.GetFiletypeSize(), self.GetTimestampSize())
+        for (text, size) in zip(details, sizes):
+            x += self.inner_spacing
+            text_items.append((text, x, y))
+            x += size[0]
 
 
 class FSExplorerDropTarget(wx.FileDropTarget):
@@ -393,6 +511,20 @@ class FSExplorerPanel(scrolled.ScrolledPanel):
     icon_spacing = 4
     icon_height = 56
     default_display_format = 'large'
+    # Number of rows either side of the visible area that we keep materialized
+    materialize_margin = 2
+    # Space between the edges of the panel and the grid of icons
+    grid_margin = 8
+    # The font for the title, created when first needed
+    _title_font = None
+    # Number of screenfuls beyond the visible area at which icons are destroyed
+    dematerialize_screens = 2
+
+    # Bits in the file_flags for each file
+    FLAG_CAN_DELETE = 1 << 0
+    FLAG_DELETE_CHECKED = 1 << 1
+    FLAG_CAN_RENAME = 1 << 2
+    FLAG_RENAME_CHECKED = 1 << 3
 
     def __init__(self, parent, *args, **kwargs):
         self.parent = parent
@@ -402,58 +534,371 @@ class FSExplorerPanel(scrolled.ScrolledPanel):
         super(FSExplorerPanel, self).__init__(parent, *args, **kwargs)
         self.SetBackgroundColour('#ededed')
         self.SetupScrolling(scroll_x=False)
+        # The whole panel is buffered, so the icons are drawn to a single surface.
+        if not self.IsDoubleBuffered():
+            self.SetDoubleBuffered(True)
         self.Bind(wx.EVT_SIZE, self.on_size)
+        self.Bind(wx.EVT_SCROLLWIN, self.on_scroll)
 
         self.selection_colour = wx.Colour(192, 192, 192)
 
-        self.icons = {}
-
-        upper = self.create_title_region()
-
-        filer_sizer = wx.WrapSizer(orient=wx.HORIZONTAL)
+        # The model is held in full, but only the icons which are visible are
+        # created as widgets; the others are not created, and the position of
+        # every cell is calculated from its index.
+        self.files = self.parent.files
+        self.file_index = dict((fsfile.leafname, index) for index, fsfile in enumerate(self.files))
+        # The icon for each file, in the same order as the files, or None if not materialized
+        self.icon_list = [None] * len(self.files)
+        # Whether each file is selected, in the same order as the files
+        self.selected_flags = bytearray(len(self.files))
+        # The FLAG_* bits for each file, in the same order as the files; these
+        # are discarded when the panel is rebuilt.
+        self.file_flags = bytearray(len(self.files))
+        self.materialized = (0, 0)
+        self.cell_size = None
+
+        self.upper = self.create_title_region()
+
+        # The number of columns of icons, which depends on the width of the panel
+        self.columns = None
+        # The top of the grid of icons, in logical coordinates
+        self.grid_top = 0
         self.text_width = {}
+        # The formatted details shown for each file, keyed by leafname
+        self.file_details = {}
 
-        # Get the size of the icons
-        dc = wx.ScreenDC()
-        for fsfile in self.parent.files:
+        # Get the size of the icons, and the widest of them
+        self.icon_text_width = self.min_text_width
+        for fsfile in self.files:
             # FIXME: Should we have ensured that these names were presentation encoding?
-            size = dc.GetTextExtent(fsfile.leafname)
-            self.text_width[fsfile.leafname] = size[0] + self.icon_padding
-
-        size = dc.GetTextExtent("M_^")
-        text_height = size[1]
-
-        text_width = self.min_text_width
-        if self.text_width:
-            text_width = max(text_width, *self.text_width.values())
-
-        for fsfile in self.parent.files:
-            if self.display_format == 'large':
-                btn = FSFileLargeIcon(self.parent, self, text_width, text_height, fsfile)
-            elif self.display_format == 'small':
-                btn = FSFileSmallIcon(self.parent, self, text_width, text_height, fsfile)
-            else:
-                btn = FSFileFullInfoIcon(self.parent, self, text_width, text_height, fsfile)
-            filer_sizer.Add(btn, 0, wx.ALL, self.icon_spacing)
-            self.icons[fsfile.leafname] = btn
+            size = measure_text(fsfile.leafname)
+            width = size[0] + self.icon_padding
+            self.text_width[fsfile.leafname] = width
+            if width > self.icon_text_width:
+                self.icon_text_width = width
+
+        size = measure_text("M_^")
+        self.icon_text_height = size[1]
+
+        if self.files:
+            # All the icons are the same size, so the first tells us how large
+            # the cells for all the others must be.
+            btn = self.create_icon(0)
+            self.icon_list[0] = btn
+            self.materialized = (0, 1)
+
+            icon_size = btn.GetMinSize()
+            self.cell_size = wx.Size(int(icon_size[0] + self.icon_spacing * 2),
+                                     int(icon_size[1] + self.icon_spacing * 2))
 
         self.Sizer = wx.BoxSizer(wx.VERTICAL)
-        if upper:
-            self.Sizer.Add(upper, 0, wx.EXPAND)
-        self.Sizer.Add(filer_sizer, 0, wx.EXPAND|wx.LEFT|wx.RIGHT, 8)
-
-        self.Layout()
+        if self.upper:
+            self.Sizer.Add(self.upper, 0, wx.EXPAND)
+        # The icons are positioned by us, as a grid of cells; the sizer only
+        # reserves the space that the grid needs.
+        self.grid_item = self.Sizer.Add(0, 0, 0, wx.EXPAND|wx.LEFT|wx.RIGHT, self.grid_margin)
+
+        # The first layout places the icons, so we only want to draw once that is done.
+        self.Freeze()
+        try:
+            self.update_grid()
+            self.update_materialized()
+        finally:
+            self.Thaw()
 
         self.drop_target = FSExplorerDropTarget(self.parent)
         self.SetDropTarget(self.drop_target)
 
     def on_size(self, evt):
-        size = self.GetSize()
-        vsize = self.GetVirtualSize()
-        self.SetVirtualSize((size[0], vsize[1]))
+        # The number of columns and the icons visible may have changed, once the
+        # size is settled.
+        wx.CallAfter(self.update_layout)
 
         evt.Skip()
 
+    def update_layout(self):
+        """
+        Update the grid and the icons visible to fit the current size of the panel.
+        """
+        if not self:
+            # The panel was destroyed before a deferred update happened
+            return
+        self.update_grid()
+        self.update_materialized()
+
+    def on_scroll(self, evt):
+        # The scroll has not happened yet, so we update the icons after it has.
+        wx.CallAfter(self.update_materialized)
+
+        evt.Skip()
+
+    def measure_text(self, text):
+        """
+        Return the size of some text, remembering it for the next time we're asked.
+        """
+        return measure_text(text)
+
+    def get_file_details(self, fsfile):
+        """
+        Return the formatted size, filetype and timestamp of a file, remembering them.
+
+        @return: tuple of (size, filetype, timestamp) strings
+        """
+        details = self.file_details.get(fsfile.leafname)
+        if details is None:
+            details = (fsfile.format_size(), fsfile.format_filetype(), fsfile.format_timestamp())
+            self.file_details[fsfile.leafname] = details
+        return details
+
+    def create_icon(self, index):
+        """
+        Create the icon widget for a given file, in the current display format.
+        """
+        fsfile = self.files[index]
+        if self.display_format == 'large':
+            btn = FSFileLargeIcon(self.parent, self, self.icon_text_width, self.icon_text_height, fsfile)
+        elif self.display_format == 'small':
+            btn = FSFileSmallIcon(self.parent, self, self.icon_text_width, self.icon_text_height, fsfile)
+        else:
+            btn = FSFileFullInfoIcon(self.parent, self, self.icon_text_width, self.icon_text_height, fsfile)
+        return btn
+
+    def materialized_icons(self):
+        """
+        Return the icons which are currently materialized.
+        """
+        (start, end) = self.materialized
+        return [fsicon for fsicon in self.icon_list[start:end] if fsicon]
+
+    def selected_icons(self):
+        """
+        Return the materialized icons which are selected.
+        """
+        return [fsicon for fsicon in self.materialized_icons() if fsicon.selected]
+
+    def selected_leafnames(self):
+        """
+        Return the leafnames of the selected files.
+        """
+        return set(self.files[index].leafname for index in self.selected_indexes())
+
+    def select_index(self, index, state=True):
+        """
+        Select or deselect a file by its index, whether or not it is materialized.
+        """
+        fsicon = self.icon_list[index]
+        if fsicon:
+            fsicon.select(state)
+        else:
+            self.selected_flags[index] = 1 if state else 0
+
+    def select_range(self, start, end, state=True):
+        """
+        Select or deselect the files in a half-open range of indexes.
+        """
+        start = max(0, start)
+        end = min(len(self.files), end)
+        if start >= end:
+            return
+        state = bool(state)
+        self.selected_flags[start:end] = bytearray(b'\x01' if state else b'\x00') * (end - start)
+
+        # Only the icons we can see within the range need redrawing
+        icon_list = self.icon_list
+        for index in range(max(start, self.materialized[0]), min(end, self.materialized[1])):
+            if icon_list[index]:
+                icon_list[index].update_background()
+
+    def select_leafnames(self, leafnames):
+        """
+        Select the files with the given names, redrawing the panel once.
+        """
+        changed = False
+        for leafname in leafnames:
+            index = self.file_index.get(leafname, None)
+            if index is not None:
+                fsicon = self.icon_list[index]
+                if fsicon:
+                    changed = changed or not fsicon.selected
+                    fsicon.select(True, refresh=False)
+                else:
+                    self.selected_flags[index] = 1
+        if changed:
+            self.Refresh(eraseBackground=False)
+
+    def _on_icon_select(self, fsicon, state):
+        """
+        Record the selection state of an icon.
+        """
+        self.selected_flags[fsicon.index] = 1 if state else 0
+
+    def set_all_selected(self, state):
+        """
+        Select or deselect all the files, invalidating the panel once.
+        """
+        state = bool(state)
+        # The icons draw themselves from the selection flags, so nothing but a
+        # redraw is needed for them, and only if one that we can see changes.
+        changed = any(fsicon.selected != state for fsicon in self.materialized_icons())
+        self.selected_flags = bytearray(b'\x01' if state else b'\x00') * len(self.files)
+        if changed:
+            self.Refresh(eraseBackground=False)
+
+    def selected_indexes(self):
+        """
+        Return the indexes of the selected files, in the order they are displayed.
+        """
+        flags = self.selected_flags
+        indexes = []
+        index = flags.find(b'\x01')
+        while index != -1:
+            indexes.append(index)
+            index = flags.find(b'\x01', index + 1)
+        return indexes
+
+    def file_can_delete(self, index):
+        """
+        Check whether a file can be deleted, remembering the result.
+        """
+        flags = self.file_flags[index]
+        if not flags & self.FLAG_DELETE_CHECKED:
+            flags |= self.FLAG_DELETE_CHECKED
+            if self.files[index].can_delete():
+                flags |= self.FLAG_CAN_DELETE
+            self.file_flags[index] = flags
+        return bool(flags & self.FLAG_CAN_DELETE)
+
+    def file_can_rename(self, index):
+        """
+        Check whether a file can be renamed, remembering the result.
+        """
+        flags = self.file_flags[index]
+        if not flags & self.FLAG_RENAME_CHECKED:
+            flags |= self.FLAG_RENAME_CHECKED
+            fsfile = self.files[index]
+            if fsfile.fs.can_rename(fsfile.filename, None):
+                flags |= self.FLAG_CAN_RENAME
+            self.file_flags[index] = flags
+        return bool(flags & self.FLAG_CAN_RENAME)
+
+    def visible_range(self, screens=0):
+        """
+        Return the range of file indexes which are visible (with a margin) in the panel.
+
+        @param screens: number of additional screenfuls to include either side
+
+        @return: tuple of (start, end) for the half-open range of visible files
+        """
+        if not self.cell_size:
+            return (0, 0)
+
+        columns = self.columns or 1
+        view_y = self.GetViewStart()[1] * self.GetScrollPixelsPerUnit()[1] - self.grid_top
+        view_height = self.GetClientSize()[1]
+        margin = self.materialize_margin + screens * (view_height // self.cell_size[1] + 1)
+
+        first_row = max(0, view_y // self.cell_size[1] - margin)
+        last_row = max(0, (view_y + view_height) // self.cell_size[1] + 1 + margin)
+
+        start = min(len(self.files), first_row * columns)
+        end = min(len(self.files), last_row * columns)
+        return (start, end)
+
+    def update_materialized(self):
+        """
+        Ensure that the icons visible in the panel exist, and those which are not are removed.
+        """
+        if not self:
+            # The panel was destroyed before a deferred update happened
+            return
+
+        (start, end) = self.visible_range()
+        (old_start, old_end) = self.materialized
+        if old_start <= start and end <= old_end:
+            # Everything we need is already present
+            return
+
+        if start <= old_end and old_start <= end:
+            # Keep the icons we already have, unless they are far out of view, so
+            # that scrolling back and forth does not keep recreating them.
+            (keep_start, keep_end) = self.visible_range(self.dematerialize_screens)
+            start = max(keep_start, min(start, old_start))
+            end = min(keep_end, max(end, old_end))
+
+        self._dematerialize(old_start, min(old_end, start))
+        self._dematerialize(max(old_start, end), old_end)
+        self._materialize(start, end)
+        self.materialized = (start, end)
+
+    def update_grid(self):
+        """
+        Size the grid of icons to the width of the panel, repositioning the icons if it changes.
+        """
+        if self.cell_size:
+            width = self.GetClientSize()[0] - self.grid_margin * 2
+            columns = max(1, width // self.cell_size[0])
+            rows = (len(self.files) + columns - 1) // columns
+            height = rows * self.cell_size[1]
+        else:
+            columns = 1
+            height = 0
+
+        if columns == self.columns:
+            return
+        self.columns = columns
+
+        self.grid_item.SetMinSize(wx.Size(0, height))
+        self.Layout()
+        self.FitInside()
+        self.grid_top = self.CalcUnscrolledPosition(self.grid_item.GetPosition())[1]
+
+        icon_list = self.icon_list
+        for index in range(*self.materialized):
+            if icon_list[index]:
+                icon_list[index].SetPosition(self.icon_position(index))
+
+    def icon_position(self, index):
+        """
+        Return the position of the icon for a file, in the current scrolled coordinates.
+        """
+        (column, row) = (index % self.columns, index // self.columns)
+        x = self.grid_margin + column * self.cell_size[0] + self.icon_spacing
+        y = self.grid_top + row * self.cell_size[1] + self.icon_spacing
+        return self.CalcScrolledPosition(wx.Point(x, y))
+
+    def _materialize(self, start, end):
+        """
+        Construct and position the icons for the files in a half-open range.
+        """
+        icon_list = self.icon_list
+        for index in range(start, end):
+            if icon_list[index]:
+                continue
+            btn = self.create_icon(index)
+            btn.SetPosition(self.icon_position(index))
+            icon_list[index] = btn
+
+    def _dematerialize(self, start, end):
+        """
+        Destroy the icons for the files in a half-open range.
+        """
+        icon_list = self.icon_list
+        for index in range(start, end):
+            btn = icon_list[index]
+            if btn is None:
+                continue
+            icon_list[index] = None
+            btn.Destroy()
+
+    @classmethod
+    def get_title_font(cls):
+        """
+        Return the font used for the title, which is shared by all the panels.
+        """
+        if cls._title_font is None:
+            cls._title_font = wx.Font(28, wx.FONTFAMILY_SWISS, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL)
+        return cls._title_font
+
     def create_title_region(self):
         region = None
         if self.parent.has_title_area:
@@ -461,7 +906,7 @@ class FSExplorerPanel(scrolled.ScrolledPanel):
             if title:
                 self._title_widget = wx.StaticText(self, -1, title)
                 self._title_widget.SetForegroundColour((0, 0, 0))
-                self._title_widget.SetFont(wx.Font(28, wx.FONTFAMILY_SWISS, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+                self._title_widget.SetFont(self.get_title_font())
                 sln = wx.StaticLine(self)
                 region = wx.BoxSizer(wx.VERTICAL)
                 region.Add(self._title_widget, 0, wx.ALIGN_CENTER_HORIZONTAL|wx.TOP, 8)
@@ -469,6 +914,40 @@ class FSExplorerPanel(scrolled.ScrolledPanel):
         return region
 
 
+def _decode_click(double, left, right, middle, control, riscos):
+    """
+    Decode the state of a mouse click into the button name, in RISC OS terms.
+
+    @return: button name, preceeded by 'D-' for double click
+    """
+    button = 'NONE'
+    if left:
+        button = 'SELECT'
+    elif right:
+        button = 'ADJUST'
+    elif middle and not double:
+        button = 'MENU'
+
+    # Now let's transform these if we're use the non-RISC OS mouse model
+    if not riscos:
+        # The non-RISC OS mouse model is:
+        #   ctrl+left toggles items
+        #   right opens menu
+        if button == 'ADJUST':
+            # Right button means Menu
+            button = 'MENU'
+
+        elif button == 'SELECT' and control:
+            # If they had control down, we change this to the Adjust button (1)
+            button = 'ADJUST'
+
+    if button != 'NONE':
+        if double:
+            button = 'D-' + button
+
+    return button
+
+
 class FSExplorerFrame(wx.Frame):
 
     has_title_area = True
@@ -484,20 +963,55 @@ class FSExplorerFrame(wx.Frame):
     support_rename = True
     support_refresh = True
     support_dropfile = False
+    # Delay (in ms) before refreshing after a change, so that several changes refresh once
+    refresh_delay = 75
+    # Number of sorted file lists to remember
+    max_sorted_files_cache = 64
+    # Number of threads to use for file operations on a selection, or 0 to perform
+    # them in turn. Threads are only used if the filesystem says that it supports them.
+    io_workers = 0
+
+    # Offsets (in steps of open_offset_x, and half-steps of open_offset_y) for each
+    # window opened in a sequence.
+    _FRAME_POS_TABLE = [((counter % 8) + ((counter // 8) % 6),
+                         (counter % 8) * 2 + ((counter // 8) % 6))
+                        for counter in range(48)]
+
+    # The (double, left, right, middle) state for each mouse event type
+    _CLICK_EVENTS = {
+            wx.wxEVT_LEFT_DCLICK: (True, True, False, False),
+            wx.wxEVT_RIGHT_DCLICK: (True, False, True, False),
+            wx.wxEVT_LEFT_DOWN: (False, True, False, False),
+            wx.wxEVT_RIGHT_DOWN: (False, False, True, False),
+            wx.wxEVT_MIDDLE_DOWN: (False, False, False, True),
+        }
+
+    # Button names for (double, left, right, middle, control, riscos mouse model)
+    _CLICK_TABLE = dict((key, _decode_click(*key))
+                        for key in itertools.product((False, True), repeat=6))
 
     def __init__(self, fs, dirname, *args, **kwargs):
         self.fs = fs
-        self.dirname = dirname
-        self.fsdir = self.fs.dir(dirname)
+        self.dirname = None
+        self._dirname_norm = None
+        self._parent_dirname = None
+        self._parent_has_open = None
         self.explorers = kwargs.pop('explorers', None)
+        self.set_dirname(dirname)
+        self.fsdir = self.get_dir(dirname)
         self.display_format = kwargs.pop('display_format', self.default_display_format)
         self.sort_order = kwargs.pop('sort_order', self.default_sort_order)
         self.panel = None
+        # None if no rebuild is pending, or whether the selection should be kept
+        self._pending_rebuild = None
+        self._io_pool = None
         self._title_text = None
         self._title_widget = None
         self._frametitle_text = None
         self.debug = False
         self.files = []
+        # The sorted files, used if we have no explorers to share them through
+        self._sorted_files_cache = {}
 
         self.shift_down = False
         self.control_down = False
@@ -511,6 +1025,12 @@ class FSExplorerFrame(wx.Frame):
         self.create_panel()
 
         self.Bind(wx.EVT_CLOSE, self.on_close)
+        self.Bind(wx.EVT_SHOW, self.on_show)
+        self.Bind(wx.EVT_ICONIZE, self.on_iconize)
+
+        self._refresh_pending = False
+        self._refresh_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_refresh_timer, self._refresh_timer)
 
         # Build up the menu we'll use
         self.menu_display = wx.Menu()
@@ -528,6 +1048,8 @@ class FSExplorerFrame(wx.Frame):
         self.add_menu_file_selection(self.menu_selection)
 
         self.menu = wx.Menu()
+        # The last state we set on the menu items, so that we only update those that change
+        self._last_menu_state = {}
         self.menu.Append(-1, 'Display', self.menu_display)
         self.menuitem_selection = self.menu.Append(-1, 'Selection', self.menu_selection)
         self.menuitem_clearselection = None
@@ -535,6 +1057,16 @@ class FSExplorerFrame(wx.Frame):
         self.menuitem_openparent = None
         self.add_menu_dirop(self.menu)
 
+    def RequestFocus(self):
+        """
+        Raise the window and give it the focus.
+
+        This must happen before any action is taken for the click, so that windows
+        which the action opens or raises are left on top of us.
+        """
+        self.Raise()
+        self.SetFocus()
+
     def click_event_to_button(self, event):
         """
         Convert from a click event to an action that we can perform.
@@ -543,44 +1075,15 @@ class FSExplorerFrame(wx.Frame):
 
         @return: button name, in RISC OS terms, preceeded by 'D-' for double click
         """
-        double = event.LeftDClick() or event.RightDClick()
-        button = 'NONE'
-        if double:
-            if event.LeftDClick():
-                button = 'SELECT'
-            elif event.RightDClick():
-                button = 'ADJUST'
-        else:
-            if event.LeftDown():
-                button = 'SELECT'
-            elif event.RightDown():
-                button = 'ADJUST'
-            elif event.MiddleDown():
-                button = 'MENU'
-
-        # Now let's transform these if we're use the non-RISC OS mouse model
-        if not self.mouse_model_riscos:
-            # The non-RISC OS mouse model is:
-            #   ctrl+left toggles items
-            #   right opens menu
-            if button == 'ADJUST':
-                # Right button means Menu
-                button = 'MENU'
-
-            elif button == 'SELECT' and self.control_down:
-                # If they had control down, we change this to the Adjust button (1)
-                button = 'ADJUST'
-
-        if button != 'NONE':
-            if double:
-                button = 'D-' + button
-
-        return button
+        (double, left, right, middle) = self._CLICK_EVENTS.get(event.GetEventType(),
+                                                               (False, False, False, False))
+
+        return self._CLICK_TABLE[(double, left, right, middle,
+                                  bool(self.control_down), bool(self.mouse_model_riscos))]
 
     def on_click(self, event):
         # Ensure that we get focus when we do this (and raise as otherwise we don't get keys)
-        self.Raise()
-        self.SetFocus()
+        self.RequestFocus()
 
         button = self.click_event_to_button(event)
 
@@ -742,12 +1245,24 @@ class FSExplorerFrame(wx.Frame):
         if sort_order is None:
             sort_order = self.sort_order
 
+        # The sorted files are reused until the directory is read again
+        self.fsdir.populate_files()
+        if self.explorers:
+            cache = self.explorers.sorted_files_cache
+        else:
+            cache = self._sorted_files_cache
+        cache_key = (self._dirname_norm, sort_order)
+        entry = cache.get(cache_key)
+        if entry and entry[0] is self.fsdir and entry[1] == self.fsdir.generation:
+            return list(entry[2])
+
         # FIXME: Invalid sort returns empty list to be clearly wrong. Maybe default to 'name'?
         files = []
-        key_func = lambda f: f.leafname
+        key_func = operator.attrgetter('leafname')
 
         if sort_order == 'name':
-            key_func = lambda f: self.fs.normalise_name(f.leafname)
+            normalise_name = self.fs.normalise_name
+            key_func = lambda f: normalise_name(f.leafname)
 
         elif sort_order == 'size':
             key_func = lambda f: 0 if f.isdir() else f.size()
@@ -760,29 +1275,47 @@ class FSExplorerFrame(wx.Frame):
 
         files = sorted(self.fsdir.files, key=key_func)
 
-        return files
+        if len(cache) >= self.max_sorted_files_cache:
+            cache.clear()
+        cache[cache_key] = (self.fsdir, self.fsdir.generation, files)
+        return list(files)
 
     def create_panel(self, keep_selection=True):
+        if self.explorers:
+            self.explorers.window_has_closed_key(self._dirname_key)
+            self.explorers.window_has_opened_key(self._dirname_key, self)
+
+        if self.panel and (not self.IsShownOnScreen() or self.IsIconized()):
+            # Nobody can see the panel, so we rebuild it when we are next shown.
+            if self._pending_rebuild is not None:
+                keep_selection = keep_selection and self._pending_rebuild
+            self._pending_rebuild = keep_selection
+            return
+        self._pending_rebuild = None
+
         last_selection = set()
-        if self.panel:
-            # Construct a list of the last selected icons in the panel
-            if keep_selection:
-                for fsicon in self.panel.icons.values():
-                    if fsicon.selected:
-                        last_selection.add(fsicon.fsfile.leafname)
+        # Nothing is drawn until the new panel is complete, so that we don't see
+        # the old panel go and the new one being laid out.
+        self.Freeze()
+        try:
+            if self.panel:
+                # Construct a list of the last selected icons in the panel
+                if keep_selection:
+                    last_selection = self.panel.selected_leafnames()
 
-            self.panel.Destroy()
-            self.panel = None
+                self.panel.Destroy()
+                self.panel = None
 
-        self.files = self.GetSortedFiles()
+            self.files = self.GetSortedFiles()
 
-        # Make a title area and sizer for the upper part of the panel
-        self.panel = FSExplorerPanel(self, display_format=self.display_format)
-        self.Layout()
+            # Make a title area and sizer for the upper part of the panel
+            self.panel = FSExplorerPanel(self, display_format=self.display_format)
+            self.Layout()
 
-        # Now re-select the old selection
-        for leafname in last_selection:
-            self.SelectFile(leafname)
+            # Now re-select the old selection
+            self.panel.select_leafnames(last_selection)
+        finally:
+            self.Thaw()
 
         # We track keys so that the right events can be delivered for running
         # or opening files with control keys pressed.
@@ -797,18 +1330,70 @@ class FSExplorerFrame(wx.Frame):
         self.panel.Bind(wx.EVT_RIGHT_DCLICK, self.on_click)
         self.panel.Bind(wx.EVT_MIDDLE_DOWN, self.on_click)
 
+    def rebuild_if_pending(self):
+        """
+        Rebuild the panel if it changed whilst we were not visible.
+        """
+        if self._pending_rebuild is not None:
+            self.create_panel(keep_selection=self._pending_rebuild)
+
+    def on_show(self, event):
+        if event.IsShown():
+            self.rebuild_if_pending()
+        event.Skip()
+
+    def on_iconize(self, event):
+        if not event.IsIconized():
+            self.rebuild_if_pending()
+        event.Skip()
+
+    def set_dirname(self, dirname):
+        """
+        Change the name of the directory we're showing, and the names we derive from it.
+        """
+        self.dirname = dirname
+        self._dirname_norm = self.fs.normalise_name(dirname)
+        # The key the explorers know us by
+        self._dirname_key = self.explorers.fsfile_key(dirname) if self.explorers else None
+        self._parent_dirname = self.fs.dirname(dirname)
+        self._parent_has_open = None
+
+    def get_dir(self, dirname):
+        """
+        Return the FSDirectory for a given directory, through the explorers' cache if we have one.
+        """
         if self.explorers:
-            self.explorers.window_has_closed(self.dirname)
-            self.explorers.window_has_opened(self.dirname, self)
+            return self.explorers.get_dir(dirname)
+        return self.fs.dir(dirname)
 
     def RefreshDirectory(self):
+        if self.explorers:
+            self.explorers.invalidate_dir(self.dirname)
         self.fs.invalidate_dir(self.dirname)
         self.fsdir.invalidate()
         self.create_panel()
 
+    def ScheduleRefresh(self):
+        """
+        Request that the directory be refreshed shortly, coalescing multiple requests.
+        """
+        if self._refresh_pending:
+            return
+        self._refresh_pending = True
+        self._refresh_timer.StartOnce(self.refresh_delay)
+
+    def on_refresh_timer(self, event):
+        if self._refresh_pending:
+            self._refresh_pending = False
+            self.RefreshDirectory()
+
     def on_close(self, event):
+        self._refresh_timer.Stop()
+        if self._io_pool:
+            self._io_pool.shutdown(wait=False)
+            self._io_pool = None
         if self.explorers:
-            self.explorers.window_has_closed(self.dirname)
+            self.explorers.window_has_closed_key(self._dirname_key)
         # This event is informational, so we pass on.
         event.Skip()
 
@@ -856,7 +1441,7 @@ class FSExplorerFrame(wx.Frame):
 
         try:
             self.fsdir.mkdir(leafname)
-            self.RefreshDirectory()
+            self.ScheduleRefresh()
         except Exception as exc:
             self.ReportError(title="Failed to create directory",
                              message=str(exc))
@@ -875,6 +1460,10 @@ class FSExplorerFrame(wx.Frame):
             # If they didn't give anything, just ignore as if they cancelled it.
             return
 
+        if leafname == fsfile.leafname:
+            # Renaming to the same name does nothing.
+            return
+
         dest_filename = self.fs.join(self.dirname, leafname)
 
         if self.debug:
@@ -882,7 +1471,7 @@ class FSExplorerFrame(wx.Frame):
 
         try:
             self.fs.rename(fsfile.filename, dest_filename)
-            self.RefreshDirectory()
+            self.ScheduleRefresh()
         except Exception as exc:
             self.ReportError(title="Failed to rename",
                              message=str(exc))
@@ -890,10 +1479,10 @@ class FSExplorerFrame(wx.Frame):
     def ChangeDirectory(self, dirname):
         if self.panel:
             if self.explorers:
-                self.explorers.window_has_closed(self.dirname)
+                self.explorers.window_has_closed_key(self._dirname_key)
 
-        self.dirname = dirname
-        self.fsdir = self.fs.dir(dirname)
+        self.set_dirname(dirname)
+        self.fsdir = self.get_dir(dirname)
         self.create_panel(keep_selection=False)
         self.UpdateFrameTitleText()
 
@@ -910,53 +1499,112 @@ class FSExplorerFrame(wx.Frame):
         self.UpdateFrameTitleText()
 
     def SelectFile(self, leafname, state=True):
-        fsicon = self.panel.icons.get(leafname, None)
-        if fsicon:
-            fsicon.select(state)
+        index = self.panel.file_index.get(leafname, None)
+        if index is not None:
+            self.panel.select_index(index, state)
+
+    def SelectRange(self, first, last, state=True):
+        """
+        Select or deselect the files displayed from one index to another, inclusive.
+        """
+        if first > last:
+            (first, last) = (last, first)
+        self.panel.select_range(first, last + 1, state)
 
     def SelectAll(self, state=True):
-        for fsicon in self.panel.icons.values():
-            fsicon.select(state)
+        self.panel.set_all_selected(state)
 
     def DeselectAll(self):
-        self.SelectAll(state=False)
+        self.panel.set_all_selected(False)
 
     def ApplySelectedFiles(self, func):
-        for fsicon in self.panel.icons.values():
-            if fsicon.selected:
-                func(fsicon.fsfile)
+        for fsfile in self.GetSelectedFiles():
+            func(fsfile)
 
     def GetSelectedFileIcons(self):
-        selection = [fsicon for fsicon in self.panel.icons.values() if fsicon.selected]
-        return selection
+        """
+        Return the icons which are selected.
+
+        Deprecated: icons only exist for the files in and near the view, so files
+        which are selected but scrolled out of view have no icon and are not
+        returned. Use GetSelectedFiles() to act on the whole selection.
+
+        @return: list of the FSFileIcon objects for the visible selected files
+        """
+        warnings.warn("GetSelectedFileIcons() only returns the icons on screen; "
+                      "use GetSelectedFiles() for the whole selection",
+                      DeprecationWarning, stacklevel=2)
+        return self.panel.selected_icons()
 
     def GetSelectedFiles(self):
-        selection = [fsicon.fsfile for fsicon in self.panel.icons.values() if fsicon.selected]
+        # Return the files in the order they are displayed
+        selection = [self.panel.files[index] for index in self.panel.selected_indexes()]
         return selection
 
+    @property
+    def fs_can_delete(self):
+        """
+        Whether the file system supports deleting files at all.
+        """
+        if self.explorers:
+            return self.explorers.fs_can_delete
+        return self.fs.can_delete(None)
+
+    @property
+    def fs_can_rename(self):
+        """
+        Whether the file system supports renaming files at all.
+        """
+        if self.explorers:
+            return self.explorers.fs_can_rename
+        return self.fs.can_rename(None, None)
+
+    def _set_menu_state(self, key, value):
+        """
+        Record the state of a menu item property.
+
+        @return: True if the state has changed
+        """
+        if key in self._last_menu_state and self._last_menu_state[key] == value:
+            return False
+        self._last_menu_state[key] = value
+        return True
+
+    def _set_enable(self, menuitem, key, value):
+        value = bool(value)
+        if self._set_menu_state(('enable', key), value):
+            menuitem.Enable(value)
+
+    def _set_label(self, menuitem, key, value):
+        if self._set_menu_state(('label', key), value):
+            menuitem.SetItemLabel(value)
+
     def on_file_menu(self, fsfile):
         if self.debug:
             print("Menu: %r" % (fsfile,))
 
         # Prepare the menu to display files
-        selection = self.GetSelectedFileIcons()
+        selected_indexes = self.panel.selected_indexes()
+        selection = [self.panel.files[index] for index in selected_indexes]
         if len(selection) == 0:
             # No files selected, so we need to grey out the selection menu
-            self.menuitem_selection.Enable(False)
-            self.menuitem_selection.SetItemLabel("File ''")
-            self.menuitem_clearselection.Enable(False)
+            self._set_enable(self.menuitem_selection, 'selection', False)
+            self._set_label(self.menuitem_selection, 'selection', "File ''")
+            self._set_enable(self.menuitem_clearselection, 'clearselection', False)
         else:
-            self.menuitem_selection.Enable(True)
+            self._set_enable(self.menuitem_selection, 'selection', True)
             if len(selection) == 1:
                 label = 'File'
-                if selection[0].fsfile.isdir():
+                if selection[0].isdir():
                     label = 'Directory'
-                self.menuitem_selection.SetItemLabel("{} '{}'".format(label, selection[0].fsfile.leafname))
+                self._set_label(self.menuitem_selection, 'selection',
+                                "{} '{}'".format(label, selection[0].leafname))
             else:
-                self.menuitem_selection.SetItemLabel("Selection")
-            self.menuitem_clearselection.Enable(True)
+                self._set_label(self.menuitem_selection, 'selection', "Selection")
+            self._set_enable(self.menuitem_clearselection, 'clearselection', True)
 
-        # Display submenu ticking
+        # Display submenu ticking; wx toggles these itself when they are picked, so
+        # we cannot know their state and must always set it.
         self.menuitem_display_large.Check(self.display_format == 'large')
         self.menuitem_display_small.Check(self.display_format == 'small')
         self.menuitem_display_fullinfo.Check(self.display_format == 'fullinfo')
@@ -967,54 +1615,50 @@ class FSExplorerFrame(wx.Frame):
 
         # New directory can only work if we can create a directory
         if self.menuitem_newdir:
-            self.menuitem_newdir.Enable(self.fsdir.can_mkdir())
+            self._set_enable(self.menuitem_newdir, 'newdir', self.fsdir.can_mkdir())
 
         # Can we delete ?
-        can_delete = False
-        if not self.support_delete or len(selection) == 0:
-            can_delete = False
-        else:
-            # Check the filesystem first - if it says no, there's no point in going further
-            if not self.fs.can_delete(None):
-                can_delete = False
-            else:
-                # We need to check all the files to see whether any are deletable.
-                for fsicon in selection:
-                    if fsicon.fsfile.can_delete():
-                        can_delete = True
-                        break
+        # Check the filesystem first - if it says no, there's no point in going further.
+        # Then we only need one of the files to be deletable.
+        can_delete = bool(self.support_delete and selection and self.fs_can_delete
+                          and any(self.panel.file_can_delete(index) for index in selected_indexes))
         if self.menuitem_file_delete:
-            self.menuitem_file_delete.Enable(can_delete)
+            self._set_enable(self.menuitem_file_delete, 'file_delete', can_delete)
 
         # Can we rename?
         can_rename = False
         if not self.support_rename or len(selection) != 1:
             can_rename = False
+        elif not self.fs_can_rename:
+            can_rename = False
         else:
-            selected_filename = selection[0].fsfile.filename
-            if self.fs.can_rename(selected_filename, None):
+            if self.panel.file_can_rename(selected_indexes[0]):
                 # This file is renameable so we can probably do this
                 can_rename = True
         if self.menuitem_file_rename:
-            self.menuitem_file_rename.Enable(can_rename)
+            self._set_enable(self.menuitem_file_rename, 'file_rename', can_rename)
 
         # Only show the parent if there is one
-        self.menuitem_openparent.Enable(bool(self.MenuHasOpenParent()))
+        self._set_enable(self.menuitem_openparent, 'openparent', self.MenuHasOpenParent())
 
         self.PopupMenu(self.menu)
 
-    def GetNextFramePos(self, counter=0):
+    def GetNextFramePos(self, counter=0, base=None):
         """
         Return a position on the screen for the next window to open at.
+
+        @param counter: The number of the window in a sequence being opened
+        @param base:    The position of this frame, or None to read it
+
+        @return: tuple of integer (x, y) coordinates
         """
         # We would like frames to appear in different positions when they're opened
         # as part of a sequence.
-        counterx = (counter % 8) + ((counter / 8) % 6)
-        countery = (counter % 8) + (((counter / 8) % 6) / 2.0)
+        (counterx, countery_halves) = self._FRAME_POS_TABLE[counter % len(self._FRAME_POS_TABLE)]
 
-        pos = self.GetPosition()
-        pos = (pos.x + int(self.open_offset_x * (counterx + 1)),
-               pos.y + int(self.open_offset_y * (countery + 1)))
+        pos = base if base is not None else self.GetPosition()
+        pos = (pos.x + self.open_offset_x * (counterx + 1),
+               pos.y + (self.open_offset_y * (countery_halves + 2)) // 2)
         return pos
 
     def OnFileActivate(self, fsfile, close=False, shift=None):
@@ -1057,10 +1701,11 @@ class FSExplorerFrame(wx.Frame):
                                    sort_order=self.sort_order)
 
     def MenuHasOpenParent(self):
-        target = self.fs.dirname(self.dirname)
-        if self.fs.normalise_name(target) == self.fs.normalise_name(self.dirname):
+        if self._parent_has_open is None:
+            self._parent_has_open = (self.fs.normalise_name(self._parent_dirname) != self._dirname_norm)
+        if not self._parent_has_open:
             return None
-        return target
+        return self._parent_dirname
 
     def OpenParentDirectory(self, pos=None):
         target = self.MenuHasOpenParent()
@@ -1068,23 +1713,80 @@ class FSExplorerFrame(wx.Frame):
             self.OpenExplorer(target, pos)
 
     def OnSelectionInfo(self):
-        def open_each(fsfile):
-            self.OnFileInfo(fsfile, counter=open_each.counter)
-            open_each.counter += 1
-        open_each.counter = 0
-
-        self.ApplySelectedFiles(open_each)
+        # Each window is offset from our position, which doesn't change as they open.
+        base = self.GetPosition()
+        for counter, fsfile in enumerate(self.GetSelectedFiles()):
+            self.OnFileInfo(fsfile, pos=self.GetNextFramePos(counter, base=base))
 
     def OnSelectionDelete(self):
-        # FIXME: This may open many windows, which is not ideal.
-        self.ApplySelectedFiles(self.OnFileDelete)
+        selection = self.GetSelectedFiles()
+        if not selection:
+            return
+        if len(selection) == 1:
+            self.OnFileDelete(selection[0])
+            return
+
+        # FIXME: Configurable confirmation warning?
+        ok = self.Confirm("Confirm delete objects",
+                          "Are you sure you want to delete {} objects?".format(len(selection)),
+                          cancel_default=True)
+        if not ok:
+            # Do not delete the files
+            return
+
+        failures = self.DeleteFiles(selection)
+        self.ScheduleRefresh()
+
+        if failures:
+            self.ReportError(title="Failed to delete",
+                             message='\n'.join("{}: {}".format(fsfile.leafname, exc)
+                                               for fsfile, exc in failures))
+
+    def get_io_pool(self):
+        """
+        Return a thread pool for file system operations, or None if we should not use threads.
+        """
+        if not self.io_workers or concurrent is None or not self.fs.supports_threads:
+            return None
+        if not self._io_pool:
+            self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.io_workers)
+        return self._io_pool
+
+    def DeleteFiles(self, fsfiles):
+        """
+        Delete a number of files, without confirmation, in parallel if possible.
 
-    def OnFileInfo(self, fsfile, counter=0):
+        The deletions are only overlapped with one another; we still wait for them
+        all to complete before returning.
+
+        @param fsfiles: List of the FSFile objects to delete
+
+        @return: list of tuples of (fsfile, exception) for the files which failed
+        """
+        failures = []
+        pool = self.get_io_pool()
+        if pool and len(fsfiles) > 1:
+            futures = [(fsfile, pool.submit(fsfile.delete)) for fsfile in fsfiles]
+            concurrent.futures.wait([future for _, future in futures])
+            for fsfile, future in futures:
+                exc = future.exception()
+                if exc is not None:
+                    failures.append((fsfile, exc))
+        else:
+            for fsfile in fsfiles:
+                try:
+                    fsfile.delete()
+                except Exception as exc:
+                    failures.append((fsfile, exc))
+        return failures
+
+    def OnFileInfo(self, fsfile, counter=0, pos=None):
         if self.debug:
             print("Info: %r" % (fsfile,))
-        pos = self.GetNextFramePos(counter)
+        if pos is None:
+            pos = self.GetNextFramePos(counter)
         if self.explorers:
-            self.explorers.open_fileinfo(fsfile.filename, pos=pos)
+            self.explorers.open_fileinfo(fsfile.filename, pos=pos, fsfile=fsfile)
         else:
             fsfileinfo = FSFileInfoFrame(self, fsfile, pos=pos)
             fsfileinfo.Show()
@@ -1102,9 +1804,15 @@ class FSExplorerFrame(wx.Frame):
             # Do not delete the file
             return
 
+        self._delete_no_confirm(fsfile)
+
+    def _delete_no_confirm(self, fsfile):
+        """
+        Delete a file without asking the user, reporting any failure.
+        """
         try:
             fsfile.delete()
-            self.RefreshDirectory()
+            self.ScheduleRefresh()
         except Exception as exc:
             self.ReportError(title="Failed to delete",
                              message=str(exc))
@@ -1121,13 +1829,43 @@ class FSExplorers(object):
     default_width = None
     default_height = None
 
+    # Number of directories to remember, and how long (in seconds) before we re-read them
+    max_dir_cache = 64
+    dir_cache_ttl = 10
+
+    # Whether the keys for filenames can be remembered (only if normalise_name is a
+    # pure function of the name), and how many to remember.
+    cache_fsfile_keys = True
+    max_fsfile_key_cache = 4096
+
     def __init__(self, fs):
         self.fs = fs
-        self.open_windows = {}
-        self.open_fileinfos = {}
+        # The windows are held weakly, so that any which are destroyed without
+        # telling us that they have closed are forgotten.
+        self.open_windows = weakref.WeakValueDictionary()
+        self.open_fileinfos = weakref.WeakValueDictionary()
+        # Maps the fsfile_key of a directory to a tuple of (FSDirectory, time read)
+        self.dir_cache = collections.OrderedDict()
+        self.fsfile_key_cache = {}
+        # Maps (fsfile_key, sort order) to a tuple of (FSDirectory, generation, sorted files)
+        # for the explorer frames to share.
+        self.sorted_files_cache = {}
+
+        # The capabilities of the file system don't change, so we only ask once.
+        self.fs_can_delete = self.fs_capability(lambda: fs.can_delete(None))
+        self.fs_can_rename = self.fs_capability(lambda: fs.can_rename(None, None))
         self.default_width = self.default_width or self.explorer_frame_cls.default_width
         self.default_height = self.default_height or self.explorer_frame_cls.default_height
 
+    def fs_capability(self, func):
+        """
+        Return whether the file system has a capability, treating any failure as no.
+        """
+        try:
+            return bool(func())
+        except Exception:
+            return False
+
     def fsfile_key(self, filename):
         """
         Return a key for the file that has been requested.
@@ -1135,33 +1873,86 @@ class FSExplorers(object):
         For systems like Windows or RISC OS, this will be a case insensitive name,
         but for Linux might be an identity.
         """
-        filenamekey = self.fs.normalise_name(filename)
+        if not self.cache_fsfile_keys:
+            return self.fs.normalise_name(filename)
+
+        filenamekey = self.fsfile_key_cache.get(filename, None)
+        if filenamekey is None:
+            if len(self.fsfile_key_cache) >= self.max_fsfile_key_cache:
+                self.fsfile_key_cache.clear()
+            filenamekey = self.fs.normalise_name(filename)
+            self.fsfile_key_cache[filename] = filenamekey
         return filenamekey
 
-    def window_has_closed(self, dirname):
+    def get_dir(self, dirname, force=False):
+        """
+        Return the FSDirectory for a given directory name, from our cache if it is recent.
+
+        @param dirname: Directory to read
+        @param force:   True to re-read the directory even if it was recently cached
+        """
         filenamekey = self.fsfile_key(dirname)
-        if filenamekey in self.open_windows:
-            del self.open_windows[filenamekey]
+        now = monotonic()
+        entry = self.dir_cache.pop(filenamekey, None)
+        if entry and not force and now - entry[1] < self.dir_cache_ttl:
+            fsdir = entry[0]
+            now = entry[1]
+        else:
+            fsdir = self.fs.dir(dirname)
+            if entry:
+                # The file system may have returned the same object we had
+                # cached, so make sure that it will be re-read.
+                fsdir.invalidate()
+
+        # Most recently used directories live at the end
+        self.dir_cache[filenamekey] = (fsdir, now)
+        while len(self.dir_cache) > self.max_dir_cache:
+            self.dir_cache.popitem(last=False)
+        return fsdir
+
+    def invalidate_dir(self, dirname):
+        """
+        Discard any cached information about a directory.
+        """
+        filenamekey = self.fsfile_key(dirname)
+        entry = self.dir_cache.pop(filenamekey, None)
+        if entry:
+            entry[0].invalidate()
+        for key in [key for key in self.sorted_files_cache if key[0] == filenamekey]:
+            del self.sorted_files_cache[key]
+
+    def window_has_closed(self, dirname):
+        self.window_has_closed_key(self.fsfile_key(dirname))
+
+    def window_has_closed_key(self, filenamekey):
+        self.open_windows.pop(filenamekey, None)
 
     def window_has_opened(self, dirname, window):
-        filenamekey = self.fsfile_key(dirname)
-        if filenamekey in self.open_windows:
+        self.window_has_opened_key(self.fsfile_key(dirname), window)
+
+    def window_has_opened_key(self, filenamekey, window):
+        existing = self.open_windows.pop(filenamekey, None)
+        if existing:
             # If there was a window already, force it to close so that we don't get multiple windows on the screen.
             # Shouldn't happen if these functions are called consistently.
-            self.open_windows[filenamekey].Close()
+            existing.Close()
         self.open_windows[filenamekey] = window
 
     def fileinfo_has_closed(self, filename):
-        filenamekey = self.fsfile_key(filename)
-        if filenamekey in self.open_fileinfos:
-            del self.open_fileinfos[filenamekey]
+        self.fileinfo_has_closed_key(self.fsfile_key(filename))
+
+    def fileinfo_has_closed_key(self, filenamekey):
+        self.open_fileinfos.pop(filenamekey, None)
 
     def fileinfo_has_opened(self, filename, window):
-        filenamekey = self.fsfile_key(filename)
-        if filenamekey in self.open_fileinfos:
+        self.fileinfo_has_opened_key(self.fsfile_key(filename), window)
+
+    def fileinfo_has_opened_key(self, filenamekey, window):
+        existing = self.open_fileinfos.pop(filenamekey, None)
+        if existing:
             # If there was a window already, force it to close so that we don't get multiple windows on the screen.
             # Shouldn't happen if these functions are called consistently.
-            self.open_fileinfos[filenamekey].Close()
+            existing.Close()
 
         self.open_fileinfos[filenamekey] = window
 
@@ -1188,11 +1979,27 @@ class FSExplorers(object):
         filenamekey = self.fsfile_key(filename)
         return self.open_fileinfos.get(filenamekey, None)
 
-    def open_fileinfo(self, filename, pos=None):
-        win = self.find_fileinfo(filename)
+    def open_fileinfo(self, filename, pos=None, fsfile=None):
+        """
+        Open a file information window, or raise it if it is already open.
+
+        @param filename:    The file to show information about
+        @param pos:         Position of the window
+        @param fsfile:      The FSFile for the file if the caller has it, or None to look it up
+        """
+        filenamekey = self.fsfile_key(filename)
+        win = self.open_fileinfos.get(filenamekey, None)
         if win:
             win.Raise()
         else:
-            fsfile = self.fs.fileinfo(filename)
-            fsfileinfo = self.fileinfo_frame_cls(self, fsfile, pos=pos, explorers=self)
-            fsfileinfo.Show()
+            if fsfile is None:
+                fsfile = self.fs.fileinfo(filename)
+            win = self.fileinfo_frame_cls(self, fsfile, pos=pos, explorers=self)
+            if self.open_fileinfos.get(filenamekey, None) is not win:
+                # The frame class didn't register itself, so we must, otherwise
+                # the next open would create another.
+                self.fileinfo_has_opened_key(filenamekey, win)
+            win.Show()
+            win.Raise()
+
+        return win
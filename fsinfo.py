@@ -2,109 +2,125 @@
 Interfaces for file information windows.
 """
 
+import collections
+import operator
 import sys
 
 import wx
 
 
+# The DC used for measuring text, created when it is first needed
+_measure_dc = None
+
+
+def measure_dc():
+    """
+    Return a DC which can be used to measure text in the default GUI font.
+
+    The DC is shared by all the windows, so must only be used from the UI thread.
+    """
+    global _measure_dc
+    if _measure_dc is None:
+        dc = wx.MemoryDC(wx.Bitmap(1, 1))
+        dc.SetFont(wx.SystemSettings.GetFont(wx.SYS_DEFAULT_GUI_FONT))
+        _measure_dc = dc
+    return _measure_dc
+
+
+# The sizes of text we have measured, keyed by the text, oldest first
+_text_extents = collections.OrderedDict()
+max_text_extents = 1024
+
+
+def measure_text(text):
+    """
+    Return the size of some text in the default GUI font, measuring it only once.
+
+    @param text:    The text to measure
+    @return: (width, height) of the text
+    """
+    size = _text_extents.get(text)
+    if size is None:
+        size = measure_dc().GetTextExtent(text)
+        if len(_text_extents) >= max_text_extents:
+            _text_extents.popitem(last=False)
+        _text_extents[text] = size
+    return size
+
+
 class FSFileInfoPanel(wx.Panel):
 
     outer_border = 8
     inner_spacing = 4
+    # The system colour we use, which is read only once
+    system_background = None
+
+    # The name of each field, and how to obtain its value from the file
+    field_generators = (
+            ('Leafname', operator.attrgetter('leafname')),
+            ('File type', operator.methodcaller('format_filetype')),
+            ('Size', operator.methodcaller('format_size')),
+            ('Date/time', operator.methodcaller('format_timestamp')),
+        )
 
     def __init__(self, parent, fsfile):
-        self.parent = parent
         self.fsfile = fsfile
 
         super(FSFileInfoPanel, self).__init__(parent, -1, style=wx.SUNKEN_BORDER)
 
-        self.list = wx.ListCtrl(self,
-                                style=wx.LC_REPORT
-                                      | wx.LC_NO_HEADER
-                                      #| wx.LC_VRULES
-                                      )
-
-        bgcolour = wx.SystemSettings.GetColour(wx.SYS_COLOUR_APPWORKSPACE)
-        self.SetBackgroundColour(bgcolour)
-
-        self.field_generators = [
-                ('Leafname', lambda fsfile: fsfile.leafname),
-                ('File type', lambda fsfile: fsfile.format_filetype()),
-                ('Size', lambda fsfile: fsfile.format_size()),
-                ('Date/time', lambda fsfile: fsfile.format_timestamp()),
-            ]
-
-        # will be overridden in populate_info
-        self.text_height = 8
-
-        self.scrollsize_x = wx.SystemSettings.GetMetric(wx.SYS_VSCROLL_X)
-        self.scrollsize_y = wx.SystemSettings.GetMetric(wx.SYS_HSCROLL_Y)
+        # Set before the text is created, so that the text inherits it
+        self.SetBackgroundColour(self.get_background_colour())
+        self.Bind(wx.EVT_SYS_COLOUR_CHANGED, self.on_sys_colour_changed)
 
+        self.grid = wx.FlexGridSizer(len(self.field_generators), 2,
+                                     self.inner_spacing, self.inner_spacing)
         self.populate_info()
 
         self.sizer = wx.BoxSizer(wx.VERTICAL)
-        self.sizer.Add(self.list, 1, wx.EXPAND | wx.ALL, self.outer_border)
+        self.sizer.Add(self.grid, 1, wx.EXPAND | wx.ALL, self.outer_border)
         self.SetSizer(self.sizer)
         self.SetAutoLayout(True)
 
-    def GetBestSize(self):
-        if False:
-            width = self.list.GetColumnWidth(0) + self.inner_spacing + self.list.GetColumnWidth(1)
-            height = (self.list.GetUserLineHeight() + 1) * self.list.GetItemCount()
-            return wx.Size(int(width + self.outer_border * 2),
-                           int(height + self.outer_border * 2))
-        else:
-            # The bottom item
-            rect = self.list.GetItemRect(self.list.GetItemCount() - 1)
-
-            width = rect.Width + self.inner_spacing
-            height = (rect.Height + self.inner_spacing) * self.list.GetItemCount()
-
-            return wx.Size(int(width + self.outer_border * 2),
-                           int(height + self.outer_border * 2))
+    @classmethod
+    def get_background_colour(cls):
+        """
+        Return the background colour for the panels, reading it from the system only once.
+        """
+        if FSFileInfoPanel.system_background is None:
+            FSFileInfoPanel.system_background = wx.SystemSettings.GetColour(wx.SYS_COLOUR_APPWORKSPACE)
+        return FSFileInfoPanel.system_background
+
+    def on_sys_colour_changed(self, event):
+        # The colours have changed, so they must be read again
+        FSFileInfoPanel.system_background = None
+        self.SetBackgroundColour(self.get_background_colour())
+        self.Refresh()
+        event.Skip()
 
     def SetBackgroundColour(self, colour):
         super(FSFileInfoPanel, self).SetBackgroundColour(colour)
-        self.list.SetBackgroundColour(colour)
+        for child in self.GetChildren():
+            child.SetBackgroundColour(colour)
 
     def populate_info(self):
+        """
+        Add the name and value of each field to the grid.
 
-        self.list.InsertColumn(0, "Property", wx.LIST_FORMAT_RIGHT)
-        self.list.InsertColumn(1, "Value")
-
-        dc = wx.ScreenDC()
-        dc.SetFont(wx.SystemSettings.GetFont(wx.SYS_DEFAULT_GUI_FONT))
-
-        maxfieldwidth = 96
-        maxvaluewidth = 96
-        maxheight = 8
-        index = 0
-        fields = []
+        The information is only a handful of fixed rows, so plain static text
+        is all we need; the sizer works out the size of the panel from it.
+        """
         for field, generator in self.field_generators:
             value = generator(self.fsfile)
-            field_size = dc.GetTextExtent(field)
-            value_size = dc.GetTextExtent(value)
-            maxfieldwidth = max(maxfieldwidth, field_size[0])
-            maxvaluewidth = max(maxvaluewidth, value_size[0])
-            #print("Size field %r/%r => %r/%r" % (field, value, field_size, value_size))
-            maxheight = max(maxheight, field_size[1])
-            fields.append((field, value))
-
-        self.text_height = maxheight
-
-        for field, value in fields:
-            self.list.InsertItem(index, field)
-            self.list.SetItem(index, 1, value)
-            index += 1
-
-        self.list.SetColumnWidth(0, wx.LIST_AUTOSIZE)
-        self.list.SetColumnWidth(1, wx.LIST_AUTOSIZE)
+            # The values may contain '&' (eg filetypes), which must not become mnemonics
+            self.grid.Add(wx.StaticText(self, label=field.replace('&', '&&')), 0, wx.ALIGN_RIGHT)
+            self.grid.Add(wx.StaticText(self, label=value.replace('&', '&&')), 0, wx.ALIGN_LEFT)
 
 
 class FSFileInfoFrame(wx.Frame):
 
     # Allow more space for the title text (eg for the buttons in the title)
     title_extra_size = 80
+    title_prefix = "File info: "
     frame_border = 3
     if sys.platform == 'win32':
         frame_border += 6
@@ -113,21 +129,36 @@ class FSFileInfoFrame(wx.Frame):
         self.parent = parent
         self.fsfile = fsfile
         self.explorers = kwargs.pop('explorers', None)
-        kwargs['title'] = "File info: {}".format(fsfile.filename)
+        # The key the explorers know us by
+        self._filekey = self.explorers.fsfile_key(fsfile.filename) if self.explorers else None
+        kwargs['title'] = self.title_prefix + fsfile.filename
 
         super(FSFileInfoFrame, self).__init__(None, *args, **kwargs)
 
-        self.panel = FSFileInfoPanel(self, fsfile)
+        self.panel = None
+        self.sizer = None
+        self.create_contents()
+
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+        if self.explorers:
+            self.explorers.fileinfo_has_opened_key(self._filekey, self)
+
+    def create_contents(self):
+        """
+        Create the panel showing the file information, and size the frame to fit it.
+        """
+        self.panel = FSFileInfoPanel(self, self.fsfile)
 
         #print("Best = %r, client= %r, size=%r, virtual=%r" % (self.panel.GetBestSize(), self.panel.GetClientSize(), self.panel.GetSize(), self.panel.GetVirtualSize()))
         size = self.panel.GetBestSize()
-        # Allow for the size of the title
-        dc = wx.ScreenDC()
-        title_size = dc.GetTextExtent(kwargs['title'])
-        size = wx.Size(int(max(title_size[0] + self.title_extra_size, size[0] + self.frame_border)),
+        # Allow for the size of the title; the prefix is the same for every window,
+        # so only the filename needs measuring each time.
+        title_width = (measure_text(self.title_prefix)[0]
+                       + measure_dc().GetTextExtent(self.fsfile.filename)[0])
+        size = wx.Size(int(max(title_width + self.title_extra_size, size[0] + self.frame_border)),
                        int(size[1] + self.frame_border))
 
-        #print("title = %r, best_size = %r" % (title_size, size))
+        #print("title = %r, best_size = %r" % (title_width, size))
 
         self.SetMaxClientSize(size)
         self.SetClientSize(size)
@@ -136,12 +167,8 @@ class FSFileInfoFrame(wx.Frame):
         self.sizer.Add(self.panel, 1, wx.EXPAND | wx.ALL, 0)
         self.SetSizer(self.sizer)
 
-        self.Bind(wx.EVT_CLOSE, self.on_close)
-        if self.explorers:
-            self.explorers.fileinfo_has_opened(self.fsfile.filename, self)
-
     def on_close(self, event):
         if self.explorers:
-            self.explorers.fileinfo_has_closed(self.fsfile.filename)
+            self.explorers.fileinfo_has_closed_key(self._filekey)
         # This event is informational, so we pass on.
         event.Skip()
@@ -4,15 +4,25 @@ Implementation of the FS interfaces for the native filesystem, using '/' as sepa
 
 
 import os
+import stat
 
 from fs import FSBase, FSFileBase, FSDirectoryBase
 
 
+try:
+    scandir = os.scandir
+except AttributeError:
+    # Python 2
+    scandir = None
+
+
 class FSNative(FSBase):
 
     def __init__(self, anchor='/'):
         super(FSNative, self).__init__()
         self.anchor = anchor
+        # Whether our filenames are already native filenames
+        self._native_is_same = (self.anchor == '/' and self.dirsep == '/')
 
     def rootname(self):
         """
@@ -39,32 +49,54 @@ class FSNative(FSBase):
         return FSDirectoryNative(self, parent_fsdir, dirname)
 
     def native_filename(self, filename):
-        if self.anchor == '/' and self.dirsep == '/':
+        if self._native_is_same:
             return filename
 
-        parts = self.split(filename)
-        parts.insert(0, self.anchor)
-        return os.path.join(*parts)
+        relative = filename.strip(self.dirsep)
+        if not relative:
+            return self.anchor
+        # Empty path components are dropped, as split() would
+        doubled = self.dirsep * 2
+        while doubled in relative:
+            relative = relative.replace(doubled, self.dirsep)
+        if self.dirsep != os.sep:
+            relative = relative.replace(self.dirsep, os.sep)
+        return os.path.join(self.anchor, relative)
 
 
 class FSFileNative(FSFileBase):
+    __slots__ = ('native_filename', '_isdir', '_stat_read', '_dir_entry')
 
     def __init__(self, fs, filename, parent=None):
         super(FSFileNative, self).__init__(fs, filename, parent)
         self.native_filename = self.fs.native_filename(self.filename)
         self._isdir = None
         self._stat_read = False
+        # The directory entry this file was read from, if any, which may hold its stat
+        self._dir_entry = None
 
     def isdir(self):
         if self._isdir is None:
-            self._isdir = os.path.isdir(self.native_filename)
+            try:
+                self._stat()
+            except OSError:
+                # Broken links and vanished files are not directories
+                self._isdir = False
         return self._isdir
 
     def _stat(self):
+        """
+        Read all the information we need about the file with a single call.
+        """
         if not self._stat_read:
-            stat = os.stat(self.native_filename)
-            self._size = stat.st_size
-            self._epochtime = stat.st_mtime
+            if self._dir_entry is not None:
+                st = self._dir_entry.stat()
+                self._dir_entry = None
+            else:
+                st = os.stat(self.native_filename)
+            self._isdir = stat.S_ISDIR(st.st_mode)
+            self._size = st.st_size
+            self._epochtime = st.st_mtime
             self._stat_read = True
         return
 
@@ -89,24 +121,43 @@ class FSDirectoryNative(FSDirectoryBase):
     """
     Object for retrieving information about files within a filesystem.
     """
+    __slots__ = ()
 
     def __init__(self, fs, parent, dirname):
         super(FSDirectoryNative, self).__init__(fs, parent, dirname)
 
-    def get_file(self, leafname):
+    def get_file(self, fileref):
         """
         Overridden: Return a FSFile object for this file.
+
+        @param fileref: The leafname of the file, or the directory entry from scandir.
         """
-        return FSFileNative(self.fs, self.fs.join(self.dirname, leafname))
+        if not hasattr(fileref, 'is_dir'):
+            return FSFileNative(self.fs, self.fs.join(self.dirname, fileref))
+
+        fsfile = FSFileNative(self.fs, self.fs.join(self.dirname, fileref.name))
+        try:
+            fsfile._isdir = fileref.is_dir()
+        except OSError:
+            fsfile._isdir = False
+        # Keep the entry so that the stat can use whatever information it already has
+        fsfile._dir_entry = fileref
+        return fsfile
 
     def get_filelist(self):
         """
         Overridden: Return a list of the files in this directory.
 
-        @return: A list of objects which describe the files in the directory; can be
+        @return: An iterable of objects which describe the files in the directory; can be
                  leafnames as strings or structures. The values will be passed to
                  get_file() to convert to a FSFile object.
         """
         ndirname = self.fs.native_filename(self.dirname)
-        files = os.listdir(ndirname)
-        return files
+        if scandir:
+            # The entries know whether they are directories without another call,
+            # and are handed over as they are read.
+            for entry in scandir(ndirname):
+                yield entry
+        else:
+            for leafname in os.listdir(ndirname):
+                yield leafname